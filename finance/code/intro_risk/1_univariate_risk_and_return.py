@@ -1,4 +1,5 @@
 import os
+import time
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -9,27 +10,28 @@ PROJECT_DIR = os.path.dirname(os.path.dirname(FILE_DIR))
 os.chdir(PROJECT_DIR)
 print(f"Working directory set to: {PROJECT_DIR}")
 
-# Download the data
-df = pd.read_csv("https://assets.datacamp.com/production/course_6836/datasets/MSFTPrices.csv")
-df.to_csv("./data/intro_risk/stock.csv", index=False)
-df.info()
-
-# Adjust data type
-df["Date"] = pd.to_datetime(df["Date"])
+DATA_URL = "https://assets.datacamp.com/production/course_6836/datasets/MSFTPrices.csv"
+CACHE_PATH = "./data/intro_risk/stock.csv"
+CACHE_TTL = 24 * 60 * 60  # seconds
 
-# Set index
-df = df.sort_values("Date")
-df = df.set_index("Date")
+# Refresh the local copy (full file, as downloaded) only when it is missing or stale
+if not os.path.exists(CACHE_PATH) or time.time() - os.path.getmtime(CACHE_PATH) >= CACHE_TTL:
+    pd.read_csv(DATA_URL).to_csv(CACHE_PATH, index=False)
 
-# Read CSV data into DataFrame
-# df = pd.read_csv("/data/intro_risk/stock.csv", parse_dates=['Date'])
-# df.set_index("Date", inplace=True)
+# Load only the columns we use, with Date parsed as the index
+read_kwargs = dict(usecols=["Date", "Adjusted"], parse_dates=["Date"], index_col="Date")
+df = pd.read_csv(CACHE_PATH, **read_kwargs).sort_index()
+df.info()
 
-# Calculate daily returns
-daily_returns = df['Adjusted'].pct_change().dropna()
+# Calculate daily returns (same as pct_change().dropna(), without the NaN-padded Series)
+adj = df['Adjusted'].to_numpy(dtype=np.float64)
+daily_returns = np.empty(adj.size - 1)
+np.divide(adj[1:], adj[:-1], out=daily_returns)
+daily_returns -= 1.0
 
-# Plot histogram of daily returns
-plt.hist(daily_returns, bins=50, density=False)
+# Plot histogram of daily returns (bin counts computed once, drawn as bars)
+counts, edges = np.histogram(daily_returns, bins=50)
+plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge')
 plt.xlabel('Daily Returns')
 plt.ylabel('Frequency')
 plt.title('Histogram of Daily Returns')
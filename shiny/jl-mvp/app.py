@@ -1,7 +1,16 @@
 from shiny import App, ui, render, reactive, req
 import sqlite3
+import threading
+import hashlib
+import hmac
+import secrets
+import numpy as np
 import pandas as pd
-from datetime import datetime
+import matplotlib
+matplotlib.use("Agg")  # headless: plots are only rendered to images for Shiny
+import matplotlib.cm as cm
+import matplotlib.pyplot as plt
+from datetime import date
 import io
 
 # ==========================================
@@ -9,20 +18,59 @@ import io
 # ==========================================
 DB_NAME = "shop.db"
 
+# Single shared connection, opened once and reused by every helper below
+_CONN = sqlite3.connect(DB_NAME, check_same_thread=False)
+_CONN.execute("PRAGMA journal_mode=WAL")
+_CONN.execute("PRAGMA synchronous=NORMAL")
+_CONN.execute("PRAGMA temp_store=MEMORY")
+_CONN.execute("PRAGMA cache_size=-20000")
+
+# Serializes writes from concurrent sessions sharing _CONN
+_WRITE_LOCK = threading.Lock()
+
+def hash_password(password, salt=None):
+    """Salted scrypt digest stored in users.password_hash as "<salt hex>$<digest hex>"."""
+    if salt is None:
+        salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=2**14, r=8, p=1)
+    return f"{salt.hex()}${digest.hex()}"
+
+def verify_password(password, stored):
+    """Re-hash with the stored salt and compare in constant time."""
+    salt_hex, sep, _ = (stored or "").partition("$")
+    if not sep:
+        return False
+    return hmac.compare_digest(stored, hash_password(password, bytes.fromhex(salt_hex)))
+
 def init_db():
     """Initialize the database with a Star Schema-ish structure for OLAP."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    c = _CONN.cursor()
     
     # Auth: Users Table
     c.execute('''
         CREATE TABLE IF NOT EXISTS users (
             username TEXT PRIMARY KEY,
-            password TEXT,
+            password_hash TEXT,
             role TEXT -- 'admin', 'inventory', 'sales' (Admin Team)
         )
     ''')
 
+    # Older databases stored plaintext passwords; hash them in place. The rename
+    # and the rehash share one explicit transaction so a crash can't leave
+    # plaintext sitting in password_hash.
+    user_cols = [row[1] for row in c.execute("PRAGMA table_info(users)")]
+    if "password" in user_cols:
+        c.execute("BEGIN")
+        try:
+            c.execute("ALTER TABLE users RENAME COLUMN password TO password_hash")
+            rows = c.execute("SELECT username, password_hash FROM users").fetchall()
+            c.executemany("UPDATE users SET password_hash = ? WHERE username = ?",
+                          [(hash_password(p), u) for u, p in rows])
+            _CONN.commit()
+        except Exception:
+            _CONN.rollback()
+            raise
+
     # Dimension: Products (Inventory)
     c.execute('''
         CREATE TABLE IF NOT EXISTS dim_laptops (
@@ -57,82 +105,143 @@ def init_db():
             sale_date TEXT,
             sale_price REAL,
             margin REAL,
+            sale_month TEXT GENERATED ALWAYS AS (substr(sale_date, 1, 7)) STORED,
             FOREIGN KEY(laptop_id) REFERENCES dim_laptops(id),
             FOREIGN KEY(lead_id) REFERENCES dim_leads(id)
         )
     ''')
+
+    # Older databases predate sale_month; SQLite can only ALTER in a VIRTUAL generated column
+    sales_cols = [row[1] for row in c.execute("PRAGMA table_xinfo(fact_sales)")]
+    if "sale_month" not in sales_cols:
+        c.execute("ALTER TABLE fact_sales ADD COLUMN sale_month TEXT GENERATED ALWAYS AS (substr(sale_date, 1, 7)) VIRTUAL")
+
+    # Indexes for the status / date filters used by the dashboard
+    c.execute("CREATE INDEX IF NOT EXISTS idx_laptops_status ON dim_laptops(status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leads_status ON dim_leads(status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_date ON fact_sales(sale_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_month ON fact_sales(sale_month)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_laptop ON fact_sales(laptop_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_lead ON fact_sales(lead_id)")
+
+    # Enriched sales view: the fact/dimension join shared by sales history and OLAP
+    c.execute('''
+        CREATE VIEW IF NOT EXISTS v_sales_enriched AS
+        SELECT
+            s.id,
+            s.sale_date,
+            s.sale_month AS month,
+            l.brand,
+            l.model,
+            c.name AS customer,
+            c.interest_level,
+            s.sale_price,
+            s.margin
+        FROM fact_sales s
+        JOIN dim_laptops l ON s.laptop_id = l.id
+        JOIN dim_leads c ON s.lead_id = c.id
+    ''')
     
-    conn.commit()
-    conn.close()
+    _CONN.commit()
 
 def seed_data():
     """Add dummy data if empty."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    # Dummy rows don't need fsync-level durability while bulk loading
+    _CONN.execute("PRAGMA synchronous=OFF")
+    try:
+        # One transaction; commits on exit regardless of which tables needed seeding
+        with _CONN:
+            c = _CONN.cursor()
     
-    # Seed Users
-    c.execute("SELECT count(*) FROM users")
-    if c.fetchone()[0] == 0:
-        users = [
-            ('admin', 'admin123', 'admin'),
-            ('inv', 'inv123', 'inventory'),
-            ('sales', 'sales123', 'sales') # Represents "Admin Team"
-        ]
-        c.executemany("INSERT INTO users VALUES (?,?,?)", users)
-
-    # Seed Laptops
-    c.execute("SELECT count(*) FROM dim_laptops")
-    if c.fetchone()[0] == 0:
-        laptops = [
-            ('Dell', 'XPS 13', 'i7, 16GB RAM', 800, 'Available', '2023-01-10'),
-            ('Lenovo', 'ThinkPad T14', 'i5, 8GB RAM', 600, 'Available', '2023-01-12'),
-            ('Apple', 'MacBook Air M1', '8GB RAM, 256GB SSD', 750, 'Available', '2023-01-15'),
-            ('HP', 'Spectre x360', 'i7, 512GB SSD', 900, 'Available', '2023-01-20'),
-            ('Asus', 'ZenBook', 'i5, 16GB', 650, 'Sold', '2023-01-05')
-        ]
-        c.executemany("INSERT INTO dim_laptops (brand, model, specs, purchase_price, status, date_added) VALUES (?,?,?,?,?,?)", laptops)
+            # Seed Users
+            c.execute("SELECT count(*) FROM users")
+            if c.fetchone()[0] == 0:
+                users = [
+                    ('admin', 'admin123', 'admin'),
+                    ('inv', 'inv123', 'inventory'),
+                    ('sales', 'sales123', 'sales') # Represents "Admin Team"
+                ]
+                c.executemany("INSERT INTO users VALUES (?,?,?)",
+                              [(u, hash_password(p), r) for u, p, r in users])
+
+            # Seed Laptops
+            c.execute("SELECT count(*) FROM dim_laptops")
+            if c.fetchone()[0] == 0:
+                laptops = [
+                    ('Dell', 'XPS 13', 'i7, 16GB RAM', 800, 'Available', '2023-01-10'),
+                    ('Lenovo', 'ThinkPad T14', 'i5, 8GB RAM', 600, 'Available', '2023-01-12'),
+                    ('Apple', 'MacBook Air M1', '8GB RAM, 256GB SSD', 750, 'Available', '2023-01-15'),
+                    ('HP', 'Spectre x360', 'i7, 512GB SSD', 900, 'Available', '2023-01-20'),
+                    ('Asus', 'ZenBook', 'i5, 16GB', 650, 'Sold', '2023-01-05')
+                ]
+                c.executemany("INSERT INTO dim_laptops (brand, model, specs, purchase_price, status, date_added) VALUES (?,?,?,?,?,?)", laptops)
         
-        # Seed Leads
-        leads = [
-            ('Alice Smith', '555-0101', 'High', 'New', '2023-01-10'),
-            ('Bob Jones', '555-0102', 'Medium', 'Contacted', '2023-01-11'),
-            ('Charlie Day', '555-0103', 'High', 'Converted', '2023-01-12')
-        ]
-        c.executemany("INSERT INTO dim_leads (name, phone, interest_level, status, created_at) VALUES (?,?,?,?,?)", leads)
+                # Seed Leads
+                leads = [
+                    ('Alice Smith', '555-0101', 'High', 'New', '2023-01-10'),
+                    ('Bob Jones', '555-0102', 'Medium', 'Contacted', '2023-01-11'),
+                    ('Charlie Day', '555-0103', 'High', 'Converted', '2023-01-12')
+                ]
+                c.executemany("INSERT INTO dim_leads (name, phone, interest_level, status, created_at) VALUES (?,?,?,?,?)", leads)
         
-        # Seed Sales
-        c.execute("INSERT INTO fact_sales (laptop_id, lead_id, sale_date, sale_price, margin) VALUES (5, 3, '2023-01-25', 850, 200)")
-    
-    # FIXED: Commit happens regardless of whether laptops existed or not
-    conn.commit()
-    conn.close()
+                # Seed Sales
+                sales = [
+                    (5, 3, '2023-01-25', 850, 200)
+                ]
+                c.executemany("INSERT INTO fact_sales (laptop_id, lead_id, sale_date, sale_price, margin) VALUES (?,?,?,?,?)", sales)
+    finally:
+        _CONN.execute("PRAGMA synchronous=NORMAL")
 
 # Run DB init on import
 init_db()
 seed_data()
 
-def run_query(query, params=(), fetch=True):
-    conn = sqlite3.connect(DB_NAME)
-    df = None
-    try:
-        if fetch:
-            df = pd.read_sql_query(query, conn, params=params)
-        else:
-            c = conn.cursor()
-            c.execute(query, params)
-            conn.commit()
-    finally:
-        conn.close()
-    return df
+# OLAP slice options -> v_sales_enriched SQL (whitelist, so safe to format into queries)
+OLAP_DIMENSIONS = {
+    "brand": "brand",
+    "interest_level": "interest_level",
+    "month": "month",
+}
+OLAP_MEASURES = {
+    "sale_price": "SUM(sale_price)",
+    "margin": "SUM(margin)",
+    "id": "COUNT(*)",
+}
+
+# Column dtypes for the fixed-schema table views
+INVENTORY_DTYPES = {"id": "int64", "purchase_price": "float64"}
+LEADS_DTYPES = {"id": "int64"}
+SALES_HISTORY_DTYPES = {"id": "int64", "sale_price": "float64", "margin": "float64"}
+
+# Reused by every plot_olap render (cleared each time) instead of a new figure per call
+_OLAP_FIG, _OLAP_AX = plt.subplots(figsize=(10, 5))
+
+def run_query(query, params=(), fetch=True, dtypes=None):
+    if fetch:
+        # Build the frame straight from cursor rows; callers with a stable
+        # schema pass dtypes so pandas doesn't have to infer them
+        cur = _CONN.execute(query, params)
+        df = pd.DataFrame.from_records(cur.fetchall(), columns=[d[0] for d in cur.description])
+        return df.astype(dtypes) if dtypes else df
+    with _WRITE_LOCK:
+        _CONN.execute(query, params)
+        _CONN.commit()
+    return None
+
+def run_scalar(query, params=()):
+    """Fetch a single row as a plain tuple (or None), skipping pandas."""
+    return _CONN.execute(query, params).fetchone()
+
+def today_str():
+    """Today's date as YYYY-MM-DD."""
+    return date.today().isoformat()
 
 def check_credentials(username, password):
     """Verify user against database."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT role FROM users WHERE username=? AND password=?", (username, password))
-    res = c.fetchone()
-    conn.close()
-    return res[0] if res else None
+    res = run_scalar("SELECT password_hash, role FROM users WHERE username=?", (username,))
+    if res and verify_password(password, res[0]):
+        return res[1]
+    return None
 
 # ==========================================
 # 2. UI COMPONENTS
@@ -220,7 +329,7 @@ def tab_sales():
                     ui.input_select("sale_laptop_id", "Select Available Laptop", choices=[]),
                     ui.input_select("sale_lead_id", "Select Customer", choices=[]),
                     ui.input_numeric("sale_price", "Selling Price ($)", value=0),
-                    ui.input_date("sale_date", "Date", value=datetime.now().strftime("%Y-%m-%d")),
+                    ui.input_date("sale_date", "Date", value=today_str()),
                     ui.br(),
                     ui.input_action_button("btn_record_sale", "Complete Sale", class_="btn-danger w-100")
                 )
@@ -281,7 +390,10 @@ def server(input, output, session):
     db_version = reactive.Value(0)
 
     def trigger_update():
-        db_version.set(db_version.get() + 1)
+        # Call once per user action, after all of its writes. Isolated so the
+        # calling effect never takes a dependency on the counter it bumps.
+        with reactive.isolate():
+            db_version.set(db_version.get() + 1)
 
     # --- LOGIN LOGIC ---
     @reactive.Effect
@@ -344,7 +456,7 @@ def server(input, output, session):
         
         if input.inv_brand() and input.inv_model():
             sql = "INSERT INTO dim_laptops (brand, model, specs, purchase_price, date_added) VALUES (?, ?, ?, ?, ?)"
-            params = (input.inv_brand(), input.inv_model(), input.inv_specs(), input.inv_price(), datetime.now().strftime("%Y-%m-%d"))
+            params = (input.inv_brand(), input.inv_model(), input.inv_specs(), input.inv_price(), today_str())
             run_query(sql, params, fetch=False)
             ui.notification_show("Laptop added!", type="message")
             trigger_update()
@@ -355,9 +467,10 @@ def server(input, output, session):
         # Logic runs even if hidden, but UI won't show it.
         # Safe to return data as the view is protected by @render.ui logic above.
         query = "SELECT id, brand, model, specs, purchase_price, status, date_added FROM dim_laptops"
-        if input.filter_status() and input.filter_status() != "All":
-            query += f" WHERE status = '{input.filter_status()}'"
-        return run_query(query)
+        status = input.filter_status()
+        if status and status != "All":
+            return run_query(query + " WHERE status = ?", (status,), dtypes=INVENTORY_DTYPES)
+        return run_query(query, dtypes=INVENTORY_DTYPES)
 
     # --- LEADS ---
     @reactive.Effect
@@ -366,7 +479,7 @@ def server(input, output, session):
         if not user_session.get(): return
         if input.lead_name():
             sql = "INSERT INTO dim_leads (name, phone, interest_level, created_at) VALUES (?, ?, ?, ?)"
-            params = (input.lead_name(), input.lead_phone(), input.lead_interest(), datetime.now().strftime("%Y-%m-%d"))
+            params = (input.lead_name(), input.lead_phone(), input.lead_interest(), today_str())
             run_query(sql, params, fetch=False)
             ui.notification_show("Lead added!", type="message")
             trigger_update()
@@ -374,7 +487,7 @@ def server(input, output, session):
     @render.data_frame
     def tbl_leads():
         db_version.get()
-        return run_query("SELECT * FROM dim_leads ORDER BY id DESC")
+        return run_query("SELECT * FROM dim_leads ORDER BY id DESC", dtypes=LEADS_DTYPES)
 
     @reactive.Effect
     def _():
@@ -383,8 +496,8 @@ def server(input, output, session):
         # This input might not exist if user is Inventory Team.
         # Shiny safely handles this, or we can wrap in try/except if using 'req'
         if "update_lead_id" in input:
-            df = run_query("SELECT id, name FROM dim_leads")
-            choices = {str(row['id']): f"{row['id']} - {row['name']}" for _, row in df.iterrows()}
+            rows = _CONN.execute("SELECT id, name FROM dim_leads").fetchall()
+            choices = {str(i): f"{i} - {name}" for i, name in rows}
             ui.update_select("update_lead_id", choices=choices)
 
     @reactive.Effect
@@ -402,12 +515,13 @@ def server(input, output, session):
         # Update Sale Selects
         db_version.get()
         if "sale_laptop_id" in input:
-            df_laptops = run_query("SELECT id, brand, model, purchase_price FROM dim_laptops WHERE status = 'Available'")
-            l_choices = {str(row['id']): f"{row['brand']} {row['model']} (Buy: ${row['purchase_price']})" for _, row in df_laptops.iterrows()}
+            # Plain tuples are enough to build choices; no DataFrame needed
+            laptops = _CONN.execute("SELECT id, brand, model, purchase_price FROM dim_laptops WHERE status = 'Available'").fetchall()
+            l_choices = {str(i): f"{b} {m} (Buy: ${p})" for i, b, m, p in laptops}
             ui.update_select("sale_laptop_id", choices=l_choices)
             
-            df_leads = run_query("SELECT id, name FROM dim_leads")
-            c_choices = {str(row['id']): row['name'] for _, row in df_leads.iterrows()}
+            leads = _CONN.execute("SELECT id, name FROM dim_leads").fetchall()
+            c_choices = {str(i): name for i, name in leads}
             ui.update_select("sale_lead_id", choices=c_choices)
 
     @reactive.Effect
@@ -416,19 +530,22 @@ def server(input, output, session):
         laptop_id = input.sale_laptop_id()
         lead_id = input.sale_lead_id()
         price = input.sale_price()
-        date = input.sale_date()
+        sale_date = input.sale_date()
         
         if laptop_id and lead_id and price:
-            df_cost = run_query("SELECT purchase_price FROM dim_laptops WHERE id = ?", (laptop_id,))
-            if not df_cost.empty:
-                cost = df_cost.iloc[0]['purchase_price']
-                margin = float(price) - cost
-                
-                sql_fact = "INSERT INTO fact_sales (laptop_id, lead_id, sale_date, sale_price, margin) VALUES (?, ?, ?, ?, ?)"
-                run_query(sql_fact, (laptop_id, lead_id, str(date), price, margin), fetch=False)
-                run_query("UPDATE dim_laptops SET status = 'Sold' WHERE id = ?", (laptop_id,), fetch=False)
-                run_query("UPDATE dim_leads SET status = 'Converted' WHERE id = ?", (lead_id,), fetch=False)
-                
+            # One transaction for the whole sale: commits once, rolls back on error
+            with _WRITE_LOCK, _CONN:
+                row = run_scalar("SELECT purchase_price FROM dim_laptops WHERE id = ?", (laptop_id,))
+                if row:
+                    cost = row[0]
+                    margin = float(price) - cost
+                    
+                    sql_fact = "INSERT INTO fact_sales (laptop_id, lead_id, sale_date, sale_price, margin) VALUES (?, ?, ?, ?, ?)"
+                    _CONN.execute(sql_fact, (laptop_id, lead_id, str(sale_date), price, margin))
+                    _CONN.execute("UPDATE dim_laptops SET status = 'Sold' WHERE id = ?", (laptop_id,))
+                    _CONN.execute("UPDATE dim_leads SET status = 'Converted' WHERE id = ?", (lead_id,))
+            
+            if row:
                 ui.notification_show("Sale recorded!", type="message")
                 trigger_update()
 
@@ -436,85 +553,75 @@ def server(input, output, session):
     def tbl_sales_history():
         db_version.get()
         sql = """
-            SELECT s.id, s.sale_date, l.brand, l.model, c.name as customer, s.sale_price, s.margin 
-            FROM fact_sales s
-            JOIN dim_laptops l ON s.laptop_id = l.id
-            JOIN dim_leads c ON s.lead_id = c.id
-            ORDER BY s.sale_date DESC
+            SELECT id, sale_date, brand, model, customer, sale_price, margin
+            FROM v_sales_enriched
+            ORDER BY sale_date DESC
         """
-        return run_query(sql)
+        return run_query(sql, dtypes=SALES_HISTORY_DTYPES)
 
     # --- ANALYTICS ---
     @reactive.Calc
     def olap_data():
+        # Aggregated in SQLite; shared by tbl_olap and plot_olap
         db_version.get()
-        sql = """
-            SELECT 
-                s.sale_date, 
-                strftime('%Y-%m', s.sale_date) as month,
-                l.brand, 
-                l.model, 
-                c.interest_level,
-                s.sale_price, 
-                s.margin,
-                s.id
-            FROM fact_sales s
-            JOIN dim_laptops l ON s.laptop_id = l.id
-            JOIN dim_leads c ON s.lead_id = c.id
+        group_col = input.olap_dimension()
+        measure_col = input.olap_measure()
+        sql = f"""
+            SELECT {OLAP_DIMENSIONS[group_col]} AS {group_col}, {OLAP_MEASURES[measure_col]} AS {measure_col}
+            FROM v_sales_enriched
+            GROUP BY 1
+            ORDER BY 1
         """
         return run_query(sql)
 
+    @reactive.Calc
+    def _totals():
+        # One aggregate query feeds all three value boxes
+        db_version.get()
+        rev, profit, units = run_scalar("SELECT COALESCE(SUM(sale_price), 0), COALESCE(SUM(margin), 0), COUNT(*) FROM fact_sales")
+        return float(rev), float(profit), int(units)
+
     @render.text
     def metric_total_rev():
-        df = olap_data()
-        val = df['sale_price'].sum() if not df.empty else 0
+        val = _totals()[0]
         return f"Revenue: ${val:,.0f}"
 
     @render.text
     def metric_total_profit():
-        df = olap_data()
-        val = df['margin'].sum() if not df.empty else 0
+        val = _totals()[1]
         return f"Profit: ${val:,.0f}"
         
     @render.text
     def metric_units_sold():
-        df = olap_data()
-        return f"Units Sold: {len(df)}"
+        return f"Units Sold: {_totals()[2]}"
 
     @render.data_frame
     def tbl_olap():
         df = olap_data()
         if df.empty: return df
-        group_col = input.olap_dimension()
-        measure_col = input.olap_measure()
-        if measure_col == 'id':
-            res = df.groupby(group_col)[measure_col].count().reset_index(name='Count')
-        else:
-            res = df.groupby(group_col)[measure_col].sum().reset_index()
-        return res
+        if input.olap_measure() == 'id':
+            return df.rename(columns={'id': 'Count'})
+        return df
 
     @render.plot
     def plot_olap():
-        import matplotlib.pyplot as plt
-        import seaborn as sns
         df = olap_data()
+        ax = _OLAP_AX
+        ax.clear()
         if df.empty: 
-            fig, ax = plt.subplots()
             ax.text(0.5, 0.5, "No Data", ha='center')
-            return fig
+            return _OLAP_FIG
         group_col = input.olap_dimension()
         measure_col = input.olap_measure()
-        fig, ax = plt.subplots(figsize=(10, 5))
         if measure_col == 'id':
-            plot_data = df.groupby(group_col)[measure_col].count().reset_index()
             y_label = "Count"
         else:
-            plot_data = df.groupby(group_col)[measure_col].sum().reset_index()
             y_label = f"Total {measure_col.replace('_', ' ').title()}"
-        sns.barplot(data=plot_data, x=group_col, y=measure_col, ax=ax, palette="viridis")
+        colors = cm.viridis(np.linspace(0, 1, len(df)))
+        ax.bar(df[group_col].astype(str), df[measure_col].to_numpy(), color=colors)
         ax.set_title(f"{y_label} by {group_col.title()}")
         ax.set_ylabel(y_label)
         ax.set_xlabel(group_col.title())
-        return fig
+        return _OLAP_FIG
 
 app = App(app_ui, server)
\ No newline at end of file
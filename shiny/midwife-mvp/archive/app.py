@@ -1,5 +1,9 @@
 import sqlite3
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # plots are only rendered to images for Shiny
+import matplotlib.pyplot as plt
 from datetime import datetime, timedelta, date
 from shiny import App, render, ui, reactive, req
 import faicons as fa
@@ -15,6 +19,9 @@ DB_NAME = "midwife.db"
 
 def init_db():
     conn = sqlite3.connect(DB_NAME)
+    # WAL lets the dashboard keep reading while a booking is being written
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     c = conn.cursor()
     
     # Midwives Table
@@ -33,6 +40,9 @@ def init_db():
                   FOREIGN KEY(customer_id) REFERENCES customers(id),
                   FOREIGN KEY(midwife_id) REFERENCES midwives(id))''')
     
+    # Composite index so overlap checks are a range seek per midwife
+    c.execute("CREATE INDEX IF NOT EXISTS ix_bookings_midwife_time ON bookings (midwife_id, start_time, end_time)")
+    
     # Seed Data
     midwives_data = [
         ('Sarah Jones', 'sarah@example.com', '+123456789', 'Postpartum Care'),
@@ -60,43 +70,59 @@ def init_db():
 # Initialize DB connection globally for this single-file app
 db_conn = init_db()
 
+# Analytics figures, created once and redrawn on each render
+stats_fig, stats_ax = plt.subplots(figsize=(8, 5))
+status_fig, status_ax = plt.subplots(figsize=(6, 6))
+
 # Helper Functions
 def get_midwives_df():
     return pd.read_sql("SELECT * FROM midwives", db_conn)
 
 def get_bookings_df():
+    # Only the columns the dashboard uses
     query = """
     SELECT 
         b.id, c.name as customer_name, m.name as midwife_name, 
-        b.start_time, b.end_time, b.status, m.email as midwife_email, c.phone as customer_phone
+        b.start_time, b.end_time, b.status
     FROM bookings b
     LEFT JOIN midwives m ON b.midwife_id = m.id
     LEFT JOIN customers c ON b.customer_id = c.id
     ORDER BY b.start_time DESC
     """
-    df = pd.read_sql(query, db_conn)
-    # Ensure datetime conversion
-    df['start_time'] = pd.to_datetime(df['start_time'])
-    df['end_time'] = pd.to_datetime(df['end_time'])
+    # Dates and categories are converted while reading, not in a second pass
+    df = pd.read_sql_query(
+        query, db_conn,
+        parse_dates={'start_time': {'format': 'ISO8601'}, 'end_time': {'format': 'ISO8601'}},
+        dtype={'midwife_name': 'category', 'status': 'category'},
+    )
     return df
 
 def check_overlap(midwife_id, start, end):
-    # Logic to prevent double booking
+    # Logic to prevent double booking: any live booking that intersects [start, end)
     query = """
-    SELECT count(*) FROM bookings 
+    SELECT 1 FROM bookings 
     WHERE midwife_id = ? 
+    AND start_time < ? AND end_time > ?
     AND status != 'Cancelled'
-    AND (
-        (start_time < ? AND end_time > ?) OR
-        (start_time >= ? AND end_time <= ?)
-    )
+    LIMIT 1
     """
-    cursor = db_conn.cursor()
-    # Note: sqlite requires string formatting for dates usually, but pandas handles it mostly. 
-    # For raw SQL, we pass strings.
-    cursor.execute(query, (midwife_id, end, start, start, end))
-    count = cursor.fetchone()[0]
-    return count > 0
+    return db_conn.execute(query, (midwife_id, end, start)).fetchone() is not None
+
+def count_today():
+    # Bookings starting today, counted in SQLite instead of loading the table
+    today = datetime.combine(date.today(), datetime.min.time())
+    query = "SELECT COUNT(*) FROM bookings WHERE start_time >= ? AND start_time < ?"
+    return db_conn.execute(query, (today, today + timedelta(days=1))).fetchone()[0]
+
+def count_reminders_due():
+    # Confirmed bookings starting within the next 24 hours (D-1 or D0)
+    now = datetime.now()
+    query = """
+    SELECT COUNT(*) FROM bookings 
+    WHERE start_time > ? AND start_time <= ?
+    AND status = 'Confirmed'
+    """
+    return db_conn.execute(query, (now, now + timedelta(days=1))).fetchone()[0]
 
 # ==========================================
 # 2. UI DEFINITION
@@ -213,11 +239,32 @@ def server(input, output, session):
     # Reactive value to trigger updates across the app when data changes
     data_trigger = reactive.Value(0)
 
+    # Cached reads: rebuilt once per data change, shared by every renderer below
+    @reactive.Calc
+    def bookings_cached():
+        data_trigger()
+        df = get_bookings_df()
+        # Day of each booking, stored once so date filters are a plain int compare
+        df['start_date'] = df['start_time'].values.astype('datetime64[D]')
+        return df
+
+    @reactive.Calc
+    def bookings_by_id():
+        # Same frame indexed by booking id for direct lookups
+        return bookings_cached().set_index('id', drop=False)
+
+    @reactive.Calc
+    def midwives_cached():
+        # The midwives table never changes at runtime, so read it once; depending
+        # on data_trigger would reset the midwife picker after every booking
+        return get_midwives_df()
+
     # Populate Midwife Select Dropdown on Load
     @reactive.Effect
     def _update_midwife_choices():
-        df = get_midwives_df()
-        choices = {str(row['id']): f"{row['name']} ({row['specialty']})" for _, row in df.iterrows()}
+        df = midwives_cached()
+        rows = df[['id', 'name', 'specialty']].itertuples(index=False, name=None)
+        choices = {str(i): f"{name} ({specialty})" for i, name, specialty in rows}
         ui.update_select("midwife_select", choices=choices)
 
     # --- 3a. Booking Logic (Transaction) ---
@@ -246,27 +293,28 @@ def server(input, output, session):
             ui.notification_show("Midwife is already booked for this slot!", type="error")
             return
 
-        # 4. Save to DB (OLTP)
-        cursor = db_conn.cursor()
-        
-        # Insert Customer (Simple upsert logic for demo)
-        cursor.execute("INSERT INTO customers (name, phone, email) VALUES (?,?,?)", 
-                       (input.cust_name(), input.cust_phone(), input.cust_email()))
-        cust_id = cursor.lastrowid
-        
-        # Insert Booking
-        cursor.execute("""
-            INSERT INTO bookings (customer_id, midwife_id, start_time, end_time, status, created_at)
-            VALUES (?, ?, ?, ?, 'Confirmed', ?)
-        """, (cust_id, midwife_id, start_dt, end_dt, datetime.now()))
-        
-        db_conn.commit()
+        # 4. Save to DB (OLTP) - one transaction, so no orphan customer if the booking fails
+        with db_conn:
+            cursor = db_conn.cursor()
+            
+            # Insert Customer (Simple upsert logic for demo)
+            cursor.execute("INSERT INTO customers (name, phone, email) VALUES (?,?,?) RETURNING id", 
+                           (input.cust_name(), input.cust_phone(), input.cust_email()))
+            cust_id = cursor.fetchone()[0]
+            
+            # Insert Booking
+            cursor.execute("""
+                INSERT INTO bookings (customer_id, midwife_id, start_time, end_time, status, created_at)
+                VALUES (?, ?, ?, ?, 'Confirmed', ?)
+                RETURNING id
+            """, (cust_id, midwife_id, start_dt, end_dt, datetime.now()))
+            booking_id = cursor.fetchone()[0]
         
         # 5. Trigger System Updates
         data_trigger.set(data_trigger() + 1)
         
         # 6. Simulate Notifications
-        ui.notification_show(f"Booking ID {cursor.lastrowid} Created!", type="message")
+        ui.notification_show(f"Booking ID {booking_id} Created!", type="message")
         ui.notification_show(f"WhatsApp sent to {input.cust_phone()}", type="success")
         ui.notification_show(f"Email sent to Midwife", type="success")
         ui.notification_show(f"Calendar Invite sent", type="success")
@@ -276,41 +324,30 @@ def server(input, output, session):
     @render.text
     def today_count():
         data_trigger() # dependency
-        df = get_bookings_df()
-        today = pd.Timestamp.now().normalize()
-        # Filter for today
-        count = len(df[df['start_time'].dt.normalize() == today])
-        return str(count)
+        return str(count_today())
 
     @render.text
     def active_midwives_count():
-        df = get_midwives_df()
+        df = midwives_cached()
         return str(len(df))
 
     @render.text
     def reminder_count():
         data_trigger()
-        df = get_bookings_df()
-        now = pd.Timestamp.now()
-        # Filter logic: Start time is within next 24 hours (D-1 or D0) and status is Confirmed
-        upcoming = df[
-            (df['start_time'] > now) & 
-            (df['start_time'] <= now + pd.Timedelta(days=1)) &
-            (df['status'] == 'Confirmed')
-        ]
-        return str(len(upcoming))
+        return str(count_reminders_due())
 
-    @render.data_frame
-    def bookings_table():
-        data_trigger()
-        df = get_bookings_df()
-        
-        # Format for display
+    @reactive.Calc
+    def bookings_display():
+        # Formatted once per data change, not on every table render
+        df = bookings_cached()
         display_df = df[['id', 'customer_name', 'midwife_name', 'start_time', 'end_time', 'status']].copy()
         display_df['start_time'] = display_df['start_time'].dt.strftime('%Y-%m-%d %H:%M')
         display_df['end_time'] = display_df['end_time'].dt.strftime('%H:%M')
-        
-        return render.DataGrid(display_df, selection_mode="row")
+        return display_df
+
+    @render.data_frame
+    def bookings_table():
+        return render.DataGrid(bookings_display(), selection_mode="row")
 
     # --- 3c. Manual Reminder System ---
     @render.text
@@ -321,14 +358,11 @@ def server(input, output, session):
             return "Please enter an Order ID."
         
         # Check if ID exists
-        df = get_bookings_df()
-        booking = df[df['id'] == int(oid)]
-        
-        if booking.empty:
+        try:
+            row = bookings_by_id().loc[int(oid)]
+        except KeyError:
             return f"Error: Order ID {oid} not found."
         
-        row = booking.iloc[0]
-        
         # Send Notification (Simulated)
         ui.notification_show(f"Reminder (D-1/D0) sent to {row['customer_name']} (WhatsApp)", duration=5)
         ui.notification_show(f"Reminder sent to {row['midwife_name']} (Email)", duration=5)
@@ -338,62 +372,54 @@ def server(input, output, session):
     # --- 3d. Availability View ---
     @render.data_frame
     def availability_table():
-        data_trigger()
         check_date = pd.Timestamp(input.check_date())
-        bookings = get_bookings_df()
-        midwives = get_midwives_df()
+        bookings = bookings_cached()
+        midwives = midwives_cached()
         
         # Filter bookings for the selected date
-        daily_bookings = bookings[bookings['start_time'].dt.normalize() == check_date]
+        daily_bookings = bookings[bookings['start_date'] == np.datetime64(check_date.date())]
         
         # Create a simple view: Midwife | 08:00 | 09:00 | ...
         # For simplicity in this grid, we just show list of bookings for that day per midwife
+        slots = daily_bookings['start_time'].dt.strftime('%H:%M') + "-" + daily_bookings['end_time'].dt.strftime('%H:%M')
+        schedule = slots.groupby(daily_bookings['midwife_name'], observed=True).agg(", ".join)
         
-        availability_data = []
-        for _, m in midwives.iterrows():
-            m_bookings = daily_bookings[daily_bookings['midwife_name'] == m['name']]
-            if m_bookings.empty:
-                schedule = "Available all day"
-            else:
-                times = [f"{r['start_time'].strftime('%H:%M')}-{r['end_time'].strftime('%H:%M')}" for _, r in m_bookings.iterrows()]
-                schedule = ", ".join(times)
-            
-            availability_data.append({
-                "Midwife": m['name'],
-                "Specialty": m['specialty'],
-                "Schedule for " + check_date.strftime('%Y-%m-%d'): schedule
-            })
+        availability_df = pd.DataFrame({
+            "Midwife": midwives['name'],
+            "Specialty": midwives['specialty'],
+            "Schedule for " + check_date.strftime('%Y-%m-%d'): midwives['name'].map(schedule).fillna("Available all day"),
+        })
             
-        return render.DataGrid(pd.DataFrame(availability_data))
+        return render.DataGrid(availability_df)
 
     # --- 3e. Analytics (OLAP) ---
+    @reactive.Calc
+    def booking_counts():
+        # value_counts shared by both analytics plots
+        df = bookings_cached()
+        return df['midwife_name'].value_counts(), df['status'].value_counts()
+
     @render.plot
     def plot_midwife_stats():
-        data_trigger()
-        df = get_bookings_df()
-        import matplotlib.pyplot as plt
-        
-        counts = df['midwife_name'].value_counts()
+        counts, _ = booking_counts()
         
-        fig, ax = plt.subplots(figsize=(8, 5))
+        ax = stats_ax
+        ax.clear()
         counts.plot(kind='bar', ax=ax, color='#0d6efd')
         ax.set_title("Total Bookings per Midwife")
         ax.set_ylabel("Count")
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        return fig
+        ax.tick_params(axis='x', labelrotation=45)
+        stats_fig.tight_layout()
+        return stats_fig
 
     @render.plot
     def plot_status_dist():
-        data_trigger()
-        df = get_bookings_df()
-        import matplotlib.pyplot as plt
-        
-        counts = df['status'].value_counts()
+        _, counts = booking_counts()
         
-        fig, ax = plt.subplots(figsize=(6, 6))
+        ax = status_ax
+        ax.clear()
         ax.pie(counts, labels=counts.index, autopct='%1.1f%%', colors=['#198754', '#ffc107', '#0dcaf0'])
         ax.set_title("Booking Status Distribution")
-        return fig
+        return status_fig
 
 app = App(app_ui, server)
\ No newline at end of file
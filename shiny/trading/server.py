@@ -4,7 +4,7 @@ import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
 import numpy as np
-from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Import our custom utilities
 import utils
@@ -27,6 +27,14 @@ def server(input, output, session):
             return None
         return utils.calculate_indicators(df, input.short_ma(), input.long_ma())
 
+    # 3. Reactive Daily Returns (shared by volatility and Monte Carlo)
+    @reactive.calc
+    def returns():
+        df = get_data()
+        if df is None:
+            return None
+        return df['Close'].pct_change().dropna().to_numpy()
+
     # --- Tab 1: Forecasting UI ---
     
     @render.ui
@@ -53,48 +61,50 @@ def server(input, output, session):
 
     @render.ui
     def volatility_ui():
-        df = get_data()
-        if df is None: return "N/A"
+        r = returns()
+        if r is None: return "N/A"
         # Calculate annualized volatility based on 30 day window
-        returns = df['Close'].pct_change()
-        vol = returns.rolling(window=30).std().iloc[-1] * np.sqrt(252) * 100
+        vol = r[-30:].std(ddof=1) * np.sqrt(252) * 100
         return f"{vol:.2f}%"
 
     @render_widget
     def price_chart():
         df = get_analyzed_data()
         if df is None: return go.Figure()
+        # OHLC comes from the raw frame; the indicator frame carries only Date/Close/EMAs
+        raw = get_data()
 
-        fig = go.Figure()
-        
-        # Candlestick
-        fig.add_trace(go.Candlestick(
-            x=df['Date'], open=df['Open'], high=df['High'],
-            low=df['Low'], close=df['Close'], name='Price'
-        ))
-        
-        # EMAs
-        fig.add_trace(go.Scatter(x=df['Date'], y=df['EMA_Short'], line=dict(color='green', width=1.5), name=f'EMA {input.short_ma()}'))
-        fig.add_trace(go.Scatter(x=df['Date'], y=df['EMA_Long'], line=dict(color='red', width=1.5), name=f'EMA {input.long_ma()}'))
+        # Hand Plotly plain arrays and build the figure in one go
+        d = df['Date'].to_numpy()
+        o, h, l, c = [raw[k].to_numpy() for k in ('Open', 'High', 'Low', 'Close')]
 
-        # Simple Linear Forecast (Projection)
-        last_30 = df.tail(30).reset_index(drop=True)
-        x = np.arange(len(last_30))
-        y = last_30['Close'].values
-        slope, intercept = np.polyfit(x, y, 1)
+        # Simple Linear Forecast (Projection): least-squares line through the last 30 closes
+        y = c[-30:]
+        x = np.arange(len(y), dtype=np.float64)
+        x_dev = x - x.mean()
+        slope = (x_dev * (y - y.mean())).sum() / (x_dev ** 2).sum()
+        intercept = y.mean() - slope * x.mean()
         
         future_days = 14
-        future_x = np.arange(len(last_30), len(last_30) + future_days)
+        future_x = np.arange(len(y), len(y) + future_days)
         future_y = slope * future_x + intercept
         
         last_date = df['Date'].iloc[-1]
-        future_dates = [last_date + timedelta(days=i) for i in range(1, future_days + 1)]
+        future_dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=future_days, freq='D')
         
-        fig.add_trace(go.Scatter(
-            x=future_dates, y=future_y, 
-            line=dict(color='blue', dash='dot'), 
-            name='Linear Trend (14d Forecast)'
-        ))
+        fig = go.Figure(data=[
+            # Candlestick
+            go.Candlestick(x=d, open=o, high=h, low=l, close=c, name='Price'),
+            # EMAs
+            go.Scatter(x=d, y=df['EMA_Short'].to_numpy(), line=dict(color='green', width=1.5), name=f'EMA {input.short_ma()}'),
+            go.Scatter(x=d, y=df['EMA_Long'].to_numpy(), line=dict(color='red', width=1.5), name=f'EMA {input.long_ma()}'),
+            # Forecast
+            go.Scatter(
+                x=future_dates, y=future_y, 
+                line=dict(color='blue', dash='dot'), 
+                name='Linear Trend (14d Forecast)'
+            ),
+        ])
 
         fig.update_layout(
             title=f"{input.ticker().upper()} Price Action",
@@ -122,23 +132,37 @@ def server(input, output, session):
         watchlist = ["BBCA", "BBRI", "BMRI", "BBNI", "TLKM", "ASII", "UNTR", "ICBP", "GOTO", "ADRO"]
         results = []
         
+        short_span = input.short_ma()
+        long_span = input.long_ma()
+        
         with ui.Progress(min=0, max=len(watchlist)) as p:
             p.set(message="Scanning market...", detail="Fetching data")
             
-            for i, ticker in enumerate(watchlist):
-                p.set(i, message=f"Scanning {ticker}...")
-                data = utils.fetch_stock_data(ticker, period="6mo")
+            # Downloads are I/O-bound, so fetch the whole watchlist concurrently,
+            # advancing the progress bar as each ticker arrives; fetch_stock_data
+            # goes through Ticker.history, which is safe to call from threads
+            datas = {}
+            with ThreadPoolExecutor(max_workers=len(watchlist)) as ex:
+                futures = {ex.submit(utils.fetch_stock_data, t, period="6mo"): t for t in watchlist}
+                for i, fut in enumerate(as_completed(futures), start=1):
+                    ticker = futures[fut]
+                    datas[ticker] = fut.result()
+                    p.set(i, message=f"Fetched {ticker}")
+            
+            for ticker in watchlist:
+                data = datas[ticker]
                 
                 if data is not None and len(data) > 50:
-                    short_ema = data['Close'].ewm(span=input.short_ma(), adjust=False).mean().iloc[-1]
-                    long_ema = data['Close'].ewm(span=input.long_ma(), adjust=False).mean().iloc[-1]
+                    # One EMA pass per span; current and previous values come off the same array
+                    closes = data['Close'].to_numpy()
+                    short = utils.ema(closes, short_span)
+                    long = utils.ema(closes, long_span)
+                    short_ema, prev_short = short[-1], short[-2]
+                    long_ema, prev_long = long[-1], long[-2]
                     price = data['Close'].iloc[-1]
                     
                     trend = "Bullish" if short_ema > long_ema else "Bearish"
                     
-                    prev_short = data['Close'].ewm(span=input.short_ma(), adjust=False).mean().iloc[-2]
-                    prev_long = data['Close'].ewm(span=input.long_ma(), adjust=False).mean().iloc[-2]
-                    
                     action = "Hold"
                     if short_ema > long_ema and prev_short <= prev_long:
                         action = "GOLDEN CROSS (Buy)"
@@ -188,18 +212,24 @@ def server(input, output, session):
 
     # --- Tab 4: Portfolio Expectation (Monte Carlo) ---
     
+    @reactive.calc
+    def mc():
+        # One simulation run feeds both the path chart and the distribution
+        df = get_data()
+        if df is None: return None
+        return utils.run_monte_carlo_simulation(df, simulations=1000, returns=returns())
+    
     @render_widget
     def monte_carlo_chart():
-        df = get_data()
-        if df is None: return go.Figure()
+        sim = mc()
+        if sim is None: return go.Figure()
         
-        simulations = 500
-        dates, paths, _ = utils.run_monte_carlo_simulation(df, simulations=simulations)
+        dates, paths, _ = sim
         
         fig = go.Figure()
         
         # Plot only first 50 paths to keep chart clean
-        for i in range(min(50, simulations)):
+        for i in range(min(50, paths.shape[1])):
             fig.add_trace(go.Scatter(
                 x=dates, y=paths[:, i], 
                 mode='lines', 
@@ -225,12 +255,11 @@ def server(input, output, session):
 
     @render_widget
     def distribution_chart():
-        df = get_data()
-        if df is None: return go.Figure()
+        sim = mc()
+        if sim is None: return go.Figure()
         
-        # Run sim just to get final prices
-        _, _, final_prices = utils.run_monte_carlo_simulation(df, simulations=1000)
-        start_price = df['Close'].iloc[-1]
+        _, paths, final_prices = sim
+        start_price = paths[0, 0]
         
         fig = px.histogram(
             x=final_prices, 
@@ -68,7 +68,7 @@ app_ui = ui.page_sidebar(
                 ui.layout_columns(
                     ui.card(
                          ui.h5("Monte Carlo Simulation (Next 90 Days)"),
-                         ui.markdown("Simulating 500 possible future price paths based on historical volatility."),
+                         ui.markdown("Simulating 1,000 possible future price paths based on historical volatility."),
                          output_widget("monte_carlo_chart")
                     ),
                     ui.card(
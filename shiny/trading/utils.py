@@ -1,54 +1,102 @@
+import os
+import tempfile
 import yfinance as yf
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+# Downloaded prices are kept here for the rest of the day
+CACHE_DIR = Path.home() / ".cache" / "idx"
 
 def fetch_stock_data(ticker, period="2y", interval="1d"):
-    """Fetches stock data from Yahoo Finance."""
+    """Fetches stock data from Yahoo Finance, cached in memory and on disk per day.
+
+    The returned frame is shared between callers, so treat it as read-only.
+    """
     if not ticker.endswith(".JK"):
         ticker = f"{ticker}.JK"
     
     try:
-        df = yf.download(ticker, period=period, interval=interval, progress=False)
-        if df.empty:
-            return None
-        # Flatten MultiIndex columns if present
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-        df.reset_index(inplace=True)
-        return df
+        return _load_stock_data(ticker, period, interval, date.today().isoformat())
     except Exception as e:
         print(f"Error fetching data: {e}")
         return None
 
-def calculate_indicators(df, short_window, long_window):
-    """Calculates EMA and signals for swing trading."""
-    df = df.copy()
-    df['EMA_Short'] = df['Close'].ewm(span=short_window, adjust=False).mean()
-    df['EMA_Long'] = df['Close'].ewm(span=long_window, adjust=False).mean()
-    df['Signal'] = 0.0
-    df['Signal'] = np.where(df['EMA_Short'] > df['EMA_Long'], 1.0, 0.0)
-    # Position change (1 = Buy, -1 = Sell)
-    df['Position'] = df['Signal'].diff()
+@lru_cache(maxsize=256)
+def _load_stock_data(ticker, period, interval, day):
+    # `day` only keys the cache so entries roll over daily; failures raise and aren't cached
+    path = CACHE_DIR / f"{ticker}_{period}_{interval}.pkl"
+    if path.exists() and date.fromtimestamp(path.stat().st_mtime).isoformat() == day:
+        try:
+            return pd.read_pickle(path)
+        except Exception:
+            pass  # unreadable cache file, download again and overwrite it
+    
+    # Ticker.history keeps no module-global state, unlike yf.download, so the
+    # screener can call this from several threads at once
+    df = yf.Ticker(ticker).history(period=period, interval=interval)
+    if df.empty:
+        raise ValueError(f"no data returned for {ticker}")
+    # history() returns exchange-local timestamps; drop the tz like download() does
+    df.index = df.index.tz_localize(None)
+    df.index.name = "Date"
+    df.reset_index(inplace=True)
+    
+    # Write to a temp file and swap it in so readers never see a partial pickle
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            df.to_pickle(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
     return df
 
+def ema(values, span):
+    """Exponential moving average (adjust=False) of a 1-D array, as a float64 ndarray."""
+    return pd.Series(values, dtype=np.float64, copy=False).ewm(span=span, adjust=False).mean().to_numpy()
+
+def calculate_indicators(df, short_window, long_window):
+    """Calculates EMA and signals for swing trading.
+
+    Returns a new frame with only Date, Close and the indicator columns;
+    OHLC/Volume stay on the input frame.
+    """
+    closes = df['Close'].to_numpy(dtype=np.float64)
+    ema_short = ema(closes, short_window)
+    ema_long = ema(closes, long_window)
+    signal = np.where(ema_short > ema_long, 1.0, 0.0)
+    return pd.DataFrame({
+        'Date': df['Date'].to_numpy(),
+        'Close': closes,
+        'EMA_Short': ema_short,
+        'EMA_Long': ema_long,
+        'Signal': signal,
+        # Position change (1 = Buy, -1 = Sell)
+        'Position': np.diff(signal, prepend=np.nan),
+    })
+
 def calculate_backtest(df, capital):
-    """Runs vectorised backtest on the provided dataframe."""
-    df = df.copy()
-    # Shift signal by 1 day to avoid lookahead bias
-    df['Strategy_Signal'] = df['Signal'].shift(1)
-    df['Log_Returns'] = np.log(df['Close'] / df['Close'].shift(1))
-    df['Strategy_Returns'] = df['Strategy_Signal'] * df['Log_Returns']
-    
-    # Cumulative Returns
-    df['Cum_Benchmark'] = df['Log_Returns'].cumsum().apply(np.exp)
-    df['Cum_Strategy'] = df['Strategy_Returns'].cumsum().apply(np.exp)
-    
-    # Equity Curves
-    df['Equity_Benchmark'] = df['Cum_Benchmark'] * capital
-    df['Equity_Strategy'] = df['Cum_Strategy'] * capital
+    """Runs vectorised backtest on the provided dataframe (needs Date, Close, Signal).
+
+    Missing closes give NaN log returns; nancumsum treats them as flat days so one
+    gap doesn't turn the rest of the equity curve into NaN.
+    """
+    close = df['Close'].to_numpy(dtype=np.float64)
+    log_returns = np.log(close[1:] / close[:-1])
+    # Yesterday's signal earns today's return, to avoid lookahead bias
+    strategy_returns = df['Signal'].to_numpy()[:-1] * log_returns
     
-    return df
+    # Equity Curves, starting from capital on day 0
+    return pd.DataFrame({
+        'Date': df['Date'].to_numpy(),
+        'Equity_Benchmark': capital * np.exp(np.nancumsum(np.concatenate(([0.0], log_returns)))),
+        'Equity_Strategy': capital * np.exp(np.nancumsum(np.concatenate(([0.0], strategy_returns)))),
+    })
 
 def calculate_metrics(df, capital):
     """Generates performance metrics from a backtested dataframe."""
@@ -61,9 +109,7 @@ def calculate_metrics(df, capital):
     cagr = (df['Equity_Strategy'].iloc[-1] / capital) ** (1/years) - 1
     
     # Max Drawdown
-    rolling_max = df['Equity_Strategy'].cummax()
-    drawdown = df['Equity_Strategy'] / rolling_max - 1
-    max_dd = drawdown.min()
+    max_dd = _max_drawdown(df['Equity_Strategy'].to_numpy(dtype=np.float64))
     
     metrics = [
         {"Metric": "Initial Capital", "Value": f"Rp {capital:,.0f}"},
@@ -75,29 +121,34 @@ def calculate_metrics(df, capital):
     ]
     return pd.DataFrame(metrics)
 
-def run_monte_carlo_simulation(df, simulations=500, time_horizon=90):
+def _max_drawdown(equity):
+    """Largest peak-to-trough fall of an equity curve, ignoring any NaN entries."""
+    peak = np.fmax.accumulate(equity)
+    return np.nanmin(equity / peak) - 1
+
+def run_monte_carlo_simulation(df, simulations=500, time_horizon=90, returns=None):
     """
     Performs Monte Carlo simulation.
+    `returns` may pass in precomputed daily returns of df['Close'] to avoid recomputing them.
     Returns:
         dates (list): Future dates
         paths (np.array): Price paths (time_horizon x simulations)
         final_prices (np.array): Distribution of prices at end of horizon
     """
-    returns = df['Close'].pct_change().dropna()
+    if returns is None:
+        returns = df['Close'].pct_change().dropna().to_numpy()
     mu = returns.mean()
-    sigma = returns.std()
+    sigma = returns.std(ddof=1)
     start_price = df['Close'].iloc[-1]
     
     # Vectorized Simulation
-    random_shocks = np.random.normal(0, 1, (time_horizon, simulations))
+    random_shocks = np.random.default_rng().standard_normal((time_horizon, simulations))
     drift = mu - 0.5 * sigma**2
     daily_returns = np.exp(drift + sigma * random_shocks)
     
-    price_paths = np.zeros_like(daily_returns)
-    price_paths[0] = start_price
-    
-    for t in range(1, time_horizon):
-        price_paths[t] = price_paths[t-1] * daily_returns[t]
+    # Day 0 is the current price; each later day compounds the previous one
+    daily_returns[0] = 1.0
+    price_paths = start_price * np.cumprod(daily_returns, axis=0)
         
     dates = [datetime.now() + timedelta(days=i) for i in range(time_horizon)]
     final_prices = price_paths[-1]